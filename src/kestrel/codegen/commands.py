@@ -20,14 +20,13 @@
 
 import functools
 import logging
-import itertools
 from collections import OrderedDict
 
 from firepit.query import Aggregation, Group, Query, Table
 
-from kestrel.utils import remove_empty_dicts, dedup_ordered_dicts
+from kestrel.utils import dedup_ordered_nonempty_dicts
 from kestrel.exceptions import *
-from kestrel.semantics import get_entity_table, get_entity_type
+from kestrel.semantics import get_entity_table
 from kestrel.symboltable import new_var
 from kestrel.syntax.parser import get_all_input_var_names
 from kestrel.codegen.data import load_data, load_data_file, dump_data_to_file
@@ -47,50 +46,47 @@ from kestrel.codegen.relations import (
 
 _logger = logging.getLogger(__name__)
 
+_REF_SUFFIXES = ("_ref", "_refs", "_reference", "_references")
+
 
 ################################################################
-#                       Private Decorators
+#                       Private Decorator
 ################################################################
 
 
-def _default_output(func):
-    # by default, create a table/view in the backend
-    # using the output var name
-    # in this case, the store backend can return no VarStruct
-    @functools.wraps(func)
-    def wrapper(stmt, session):
-        ret = func(stmt, session)
-        if not ret:
-            var_struct = new_var(
-                session.store, stmt["output"], [], stmt, session.symtable
-            )
-            return var_struct, None
-        else:
-            return ret
-
-    return wrapper
-
-
-def _guard_empty_input(func):
-    @functools.wraps(func)
-    def wrapper(stmt, session):
-        for varname in get_all_input_var_names(stmt):
-            v = session.symtable[varname]
-            if v.length + v.records_count == 0:
-                raise EmptyInputVariable(v)
-        else:
-            return func(stmt, session)
-
-    return wrapper
-
+def _command(default_output=False, guard_empty_input=False):
+    # a single wrapper per command (one extra frame per call):
+    # - always: debug log the statement
+    # - guard_empty_input: raise if any input variable is empty
+    # - default_output: by default, create a table/view in the backend
+    #   using the output var name; in this case, the store backend
+    #   can return no VarStruct
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(stmt, session):
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("Executing '%s' with statement: %s", func.__name__, stmt)
+
+            if guard_empty_input:
+                symtable = session.symtable
+                for varname in get_all_input_var_names(stmt):
+                    v = symtable[varname]
+                    if v.length + v.records_count == 0:
+                        raise EmptyInputVariable(v)
+
+            ret = func(stmt, session)
+
+            if default_output and not ret:
+                var_struct = new_var(
+                    session.store, stmt["output"], [], stmt, session.symtable
+                )
+                return var_struct, None
+            else:
+                return ret
 
-def _debug_logger(func):
-    @functools.wraps(func)
-    def wrapper(stmt, session):
-        _logger.debug(f"Executing '{func.__name__}' with statement: {stmt}")
-        return func(stmt, session)
+        return wrapper
 
-    return wrapper
+    return decorator
 
 
 ################################################################
@@ -98,40 +94,31 @@ def _debug_logger(func):
 ################################################################
 
 
-@_debug_logger
-@_default_output
+@_command(default_output=True)
 def merge(stmt, session):
-    entity_types = list(
-        set(
-            [get_entity_type(var_name, session.symtable) for var_name in stmt["inputs"]]
-        )
-    )
+    input_vars = [session.symtable[v_name] for v_name in stmt["inputs"]]
+    entity_types = {v.type for v in input_vars}
     if len(entity_types) > 1:
-        raise NonUniformEntityType(entity_types)
-    entity_tables = [
-        get_entity_table(var_name, session.symtable) for var_name in stmt["inputs"]
-    ]
+        raise NonUniformEntityType(list(entity_types))
+    entity_tables = [v.entity_table for v in input_vars]
     session.store.merge(stmt["output"], entity_tables)
     output = new_var(session.store, stmt["output"], [], stmt, session.symtable)
     return output, None
 
 
-@_debug_logger
-@_default_output
+@_command(default_output=True)
 def new(stmt, session):
     stmt["type"] = load_data(session.store, stmt["output"], stmt["data"], stmt["type"])
 
 
-@_debug_logger
-@_default_output
+@_command(default_output=True)
 def load(stmt, session):
     stmt["type"] = load_data_file(
         session.store, stmt["output"], stmt["path"], stmt["type"]
     )
 
 
-@_debug_logger
-@_guard_empty_input
+@_command(guard_empty_input=True)
 def save(stmt, session):
     dump_data_to_file(
         session.store, get_entity_table(stmt["input"], session.symtable), stmt["path"]
@@ -139,19 +126,15 @@ def save(stmt, session):
     return None, None
 
 
-@_debug_logger
+@_command()
 def info(stmt, session):
     header = session.store.columns(get_entity_table(stmt["input"], session.symtable))
+    entity = session.symtable[stmt["input"]]
     direct_attrs, associ_attrs, custom_attrs, references = [], [], [], []
     for field in header:
         if field.startswith("x_"):
             custom_attrs.append(field)
-        elif (
-            field.endswith("_ref")
-            or field.endswith("_refs")
-            or field.endswith("_reference")
-            or field.endswith("_references")
-        ):
+        elif field.endswith(_REF_SUFFIXES):
             # not useful in existing version, so do not display
             references.append(field)
         elif "_ref." in field or "_ref_" in field:
@@ -160,91 +143,90 @@ def info(stmt, session):
             direct_attrs.append(field)
 
     disp = OrderedDict()
-    disp["Entity Type"] = session.symtable[stmt["input"]].type
-    disp["Number of Entities"] = str(len(session.symtable[stmt["input"]]))
-    disp["Number of Records"] = str(session.symtable[stmt["input"]].records_count)
+    disp["Entity Type"] = entity.type
+    disp["Number of Entities"] = str(len(entity))
+    disp["Number of Records"] = str(entity.records_count)
     disp["Entity Attributes"] = ", ".join(direct_attrs)
-    disp["Indirect Attributes"] = [
-        ", ".join(g)
-        for _, g in itertools.groupby(associ_attrs, lambda x: x.rsplit(".", 1)[0])
-    ]
+    associ_groups = {}
+    for attr in associ_attrs:
+        associ_groups.setdefault(attr.rsplit(".", 1)[0], []).append(attr)
+    disp["Indirect Attributes"] = [", ".join(g) for g in associ_groups.values()]
     disp["Customized Attributes"] = ", ".join(custom_attrs)
-    disp["Birth Command"] = session.symtable[stmt["input"]].birth_statement["command"]
-    disp["Associated Datasource"] = session.symtable[stmt["input"]].data_source
-    disp["Dependent Variables"] = ", ".join(
-        session.symtable[stmt["input"]].dependent_variables
-    )
+    disp["Birth Command"] = entity.birth_statement["command"]
+    disp["Associated Datasource"] = entity.data_source
+    disp["Dependent Variables"] = ", ".join(entity.dependent_variables)
 
     return None, DisplayDict(disp)
 
 
-@_debug_logger
+@_command()
 def disp(stmt, session):
-    if session.symtable[stmt["input"]].entity_table:
-        content = session.store.lookup(
-            get_entity_table(stmt["input"], session.symtable),
-            stmt["attrs"],
-            stmt["limit"],
-        )
+    entity_table = get_entity_table(stmt["input"], session.symtable)
+    if entity_table:
+        content = session.store.lookup(entity_table, stmt["attrs"], stmt["limit"])
     else:
         content = []
-    return None, DisplayDataframe(dedup_ordered_dicts(remove_empty_dicts(content)))
+    return None, DisplayDataframe(dedup_ordered_nonempty_dicts(content))
 
 
-@_debug_logger
-@_default_output
+@_command(default_output=True)
 def get(stmt, session):
-    local_var_table = stmt["output"] + "_local"
+    store = session.store
+    symtable = session.symtable
+    stixquery_config = session.config["stixquery"]
     return_var_table = stmt["output"]
+    local_var_table = return_var_table + "_local"
+    prefetch_ret_var_table = return_var_table + "_prefetch"
     return_type = stmt["type"]
-    start_offset = session.config["stixquery"]["timerange_start_offset"]
-    end_offset = session.config["stixquery"]["timerange_stop_offset"]
+    time_range = stmt["timerange"]
+    start_offset = stixquery_config["timerange_start_offset"]
+    end_offset = stixquery_config["timerange_stop_offset"]
 
     pattern = build_pattern(
         stmt["patternbody"],
-        stmt["timerange"],
+        time_range,
         start_offset,
         end_offset,
-        session.symtable,
-        session.store,
+        symtable,
+        store,
     )
 
     if "variablesource" in stmt:
-        session.store.filter(
-            stmt["output"],
-            stmt["type"],
-            get_entity_table(stmt["variablesource"], session.symtable),
+        variable_source = stmt["variablesource"]
+        store.filter(
+            return_var_table,
+            return_type,
+            get_entity_table(variable_source, symtable),
             pattern,
         )
-        output = new_var(session.store, return_var_table, [], stmt, session.symtable)
-        _logger.debug(f"get from variable source \"{stmt['variablesource']}\"")
+        output = new_var(store, return_var_table, [], stmt, symtable)
+        _logger.debug('get from variable source "%s"', variable_source)
 
     elif "datasource" in stmt:
         # rs: RetStruct
         rs = session.data_source_manager.query(
             stmt["datasource"], pattern, session.session_id
         )
-        query_id = rs.load_to_store(session.store)
-        session.store.extract(local_var_table, return_type, query_id, pattern)
-        _output = new_var(session.store, local_var_table, [], stmt, session.symtable)
+        query_id = rs.load_to_store(store)
+        store.extract(local_var_table, return_type, query_id, pattern)
+        _output = new_var(store, local_var_table, [], stmt, symtable)
         _logger.debug(
-            f"native GET pattern executed and DB view {local_var_table} extracted."
+            "native GET pattern executed and DB view %s extracted.", local_var_table
         )
 
         if session.config["prefetch"]["get"] and len(_output):
-            prefetch_ret_var_table = return_var_table + "_prefetch"
             prefetch_ret_entity_table = _prefetch(
                 return_type,
                 prefetch_ret_var_table,
                 local_var_table,
-                stmt["timerange"],
+                time_range,
                 start_offset,
                 end_offset,
                 {local_var_table: _output},
-                session.store,
+                store,
                 session.session_id,
                 session.data_source_manager,
-                session.config["stixquery"]["support_id"],
+                stixquery_config["support_id"],
             )
 
             if return_type == "process" and get_entity_id_attribute(_output) != "id":
@@ -258,28 +240,15 @@ def get(stmt, session):
         else:
             prefetch_ret_entity_table = None
 
-        if prefetch_ret_entity_table:
-            _logger.debug(
-                f"merge {local_var_table} and {prefetch_ret_entity_table} into {return_var_table}."
-            )
-            session.store.merge(
-                return_var_table, [local_var_table, prefetch_ret_entity_table]
-            )
-            for v in list(
-                set(
-                    [local_var_table, prefetch_ret_entity_table, prefetch_ret_var_table]
-                )
-            ):
-                if not session.debug_mode:
-                    _logger.debug(f"remove temp store view {v}.")
-                    session.store.remove_view(v)
-        else:
-            _logger.debug(
-                f'prefetch return None, just rename native GET pattern matching results into "{return_var_table}".'
-            )
-            session.store.rename_view(local_var_table, return_var_table)
+        _finalize_with_prefetch(
+            session,
+            return_var_table,
+            local_var_table,
+            prefetch_ret_entity_table,
+            prefetch_ret_var_table,
+        )
 
-        output = new_var(session.store, return_var_table, [], stmt, session.symtable)
+        output = new_var(store, return_var_table, [], stmt, symtable)
 
     else:
         raise KestrelInternalError(f"unknown type of source in {str(stmt)}")
@@ -287,29 +256,33 @@ def get(stmt, session):
     return output, None
 
 
-@_debug_logger
-@_default_output
-@_guard_empty_input
+@_command(default_output=True, guard_empty_input=True)
 def find(stmt, session):
+    store = session.store
+    symtable = session.symtable
+    stixquery_config = session.config["stixquery"]
     return_type = stmt["type"]
-    input_type = session.symtable[stmt["input"]].type
     input_var_name = stmt["input"]
+    input_type = symtable[input_var_name].type
     return_var_table = stmt["output"]
-    local_var_table = stmt["output"] + "_local"
-    local_var_event_name = stmt["output"] + "_asso_event"
+    local_var_table = return_var_table + "_local"
+    prefetch_ret_var_table = return_var_table + "_prefetch"
+    local_var_event_name = return_var_table + "_asso_event"
     relation = stmt["relation"]
     is_reversed = stmt["reversed"]
     time_range = stmt["timerange"]
     event_type = "x-oca-event"
-    start_offset = session.config["stixquery"]["timerange_start_offset"]
-    end_offset = session.config["stixquery"]["timerange_stop_offset"]
+    start_offset = stixquery_config["timerange_start_offset"]
+    end_offset = stixquery_config["timerange_stop_offset"]
+
+    store_types = store.types()
 
-    if return_type not in session.store.types():
+    if return_type not in store_types:
         # return empty variable
-        output = new_var(session.store, None, [], stmt, session.symtable)
+        output = new_var(store, None, [], stmt, symtable)
 
     else:
-        _symtable = {input_var_name: session.symtable[input_var_name]}
+        _symtable = {input_var_name: symtable[input_var_name]}
 
         event_pattern = None
 
@@ -320,9 +293,9 @@ def find(stmt, session):
             )
 
             if (
-                event_type in session.store.types()
+                input_type != return_type
                 and are_entities_associated_with_x_ibm_event([input_type, return_type])
-                and input_type != return_type
+                and event_type in store_types
             ):
                 try:
                     event_in_pattern_body = compile_x_ibm_event_search_flow_in_pattern(
@@ -334,13 +307,13 @@ def find(stmt, session):
                         start_offset,
                         end_offset,
                         _symtable,
-                        session.store,
+                        store,
                     )
-                    session.store.extract(
+                    store.extract(
                         local_var_event_name, event_type, None, event_in_pattern
                     )
                     _symtable[local_var_event_name] = new_var(
-                        session.store, local_var_event_name, [], stmt, session.symtable
+                        store, local_var_event_name, [], stmt, symtable
                     )
                     event_out_pattern_body = (
                         compile_x_ibm_event_search_flow_out_pattern(
@@ -353,11 +326,13 @@ def find(stmt, session):
                         start_offset,
                         end_offset,
                         _symtable,
-                        session.store,
+                        store,
                     )
                     if not session.debug_mode:
-                        _logger.debug(f"remove temp store view {local_var_event_name}.")
-                        session.store.remove_view(local_var_event_name)
+                        _logger.debug(
+                            "remove temp store view %s.", local_var_event_name
+                        )
+                        store.remove_view(local_var_event_name)
 
                 except InvalidAttribute:
                     _logger.warning(
@@ -375,7 +350,7 @@ def find(stmt, session):
                 start_offset,
                 end_offset,
                 _symtable,
-                session.store,
+                store,
             )
         except InvalidAttribute:
             local_pattern = None
@@ -385,10 +360,8 @@ def find(stmt, session):
         # by default, `session.store.extract` will generate new entity_table named `local_var_table`
         # `extract` does not support the case both query_id and pattern are None
         if local_pattern:
-            session.store.extract(local_var_table, return_type, None, local_pattern)
-            _output = new_var(
-                session.store, local_var_table, [], stmt, session.symtable
-            )
+            store.extract(local_var_table, return_type, None, local_pattern)
+            _output = new_var(store, local_var_table, [], stmt, symtable)
 
             # Second, prefetch all records of the entities and associated entities
             if (
@@ -396,7 +369,6 @@ def find(stmt, session):
                 and len(_output)
                 and _output.data_source
             ):
-                prefetch_ret_var_table = return_var_table + "_prefetch"
                 prefetch_ret_entity_table = _prefetch(
                     return_type,
                     prefetch_ret_var_table,
@@ -405,10 +377,10 @@ def find(stmt, session):
                     start_offset,
                     end_offset,
                     {local_var_table: _output},
-                    session.store,
+                    store,
                     session.session_id,
                     session.data_source_manager,
-                    session.config["stixquery"]["support_id"],
+                    stixquery_config["support_id"],
                 )
 
                 # special handling for process to filter out impossible relational processes
@@ -428,43 +400,24 @@ def find(stmt, session):
             else:
                 prefetch_ret_entity_table = None
 
-            if prefetch_ret_entity_table:
-                _logger.debug(
-                    f"merge {local_var_table} and {prefetch_ret_entity_table} into {return_var_table}."
-                )
-                session.store.merge(
-                    return_var_table, [local_var_table, prefetch_ret_entity_table]
-                )
-                for v in list(
-                    set(
-                        [
-                            local_var_table,
-                            prefetch_ret_entity_table,
-                            prefetch_ret_var_table,
-                        ]
-                    )
-                ):
-                    if not session.debug_mode:
-                        _logger.debug(f"remove temp store view {v}.")
-                        session.store.remove_view(v)
-            else:
-                _logger.debug(
-                    f'prefetch return None, just rename native GET pattern matching results into "{return_var_table}".'
-                )
-                session.store.rename_view(local_var_table, return_var_table)
+            _finalize_with_prefetch(
+                session,
+                return_var_table,
+                local_var_table,
+                prefetch_ret_entity_table,
+                prefetch_ret_var_table,
+            )
 
         else:
             return_var_table = None
             _logger.info(f'no relation "{relation}" on this dataset')
 
-        output = new_var(session.store, return_var_table, [], stmt, session.symtable)
+        output = new_var(store, return_var_table, [], stmt, symtable)
 
     return output, None
 
 
-@_debug_logger
-@_default_output
-@_guard_empty_input
+@_command(default_output=True, guard_empty_input=True)
 def join(stmt, session):
     session.store.join(
         stmt["output"],
@@ -475,9 +428,7 @@ def join(stmt, session):
     )
 
 
-@_debug_logger
-@_default_output
-@_guard_empty_input
+@_command(default_output=True, guard_empty_input=True)
 def group(stmt, session):
     query = Query(
         [Table(get_entity_table(stmt["input"], session.symtable)), Group(stmt["paths"])]
@@ -488,9 +439,7 @@ def group(stmt, session):
     session.store.assign_query(stmt["output"], query)
 
 
-@_debug_logger
-@_default_output
-@_guard_empty_input
+@_command(default_output=True, guard_empty_input=True)
 def sort(stmt, session):
     session.store.assign(
         stmt["output"],
@@ -501,9 +450,7 @@ def sort(stmt, session):
     )
 
 
-@_debug_logger
-@_default_output
-@_guard_empty_input
+@_command(default_output=True, guard_empty_input=True)
 def apply(stmt, session):
     arg_vars = [session.symtable[v_name] for v_name in stmt["inputs"]]
     display = session.analytics_manager.execute(
@@ -567,7 +514,7 @@ def _prefetch(
         str: the entity table in store if the prefetch is performed else None.
     """
 
-    _logger.debug(f"prefetch {return_type} to extend {input_var_name}.")
+    _logger.debug("prefetch %s to extend %s.", return_type, input_var_name)
 
     pattern_body = compile_identical_entity_search_pattern(
         input_var_name, symtable[input_var_name], does_support_id
@@ -586,18 +533,51 @@ def _prefetch(
             # build the return_var_name view in store
             store.extract(return_var_name, return_type, query_id, remote_pattern)
 
-            _logger.debug(f"prefetch successful.")
+            _logger.debug("prefetch successful.")
             return return_var_name
 
     _logger.info(f"prefetch return empty.")
     return None
 
 
+def _finalize_with_prefetch(
+    session,
+    return_var_table,
+    local_var_table,
+    prefetch_ret_entity_table,
+    prefetch_ret_var_table,
+):
+    # build the `return_var_table` view from the local results and
+    # the prefetched entities (if any), then clean up temp views
+    if prefetch_ret_entity_table:
+        _logger.debug(
+            "merge %s and %s into %s.",
+            local_var_table,
+            prefetch_ret_entity_table,
+            return_var_table,
+        )
+        session.store.merge(
+            return_var_table, [local_var_table, prefetch_ret_entity_table]
+        )
+        if not session.debug_mode:
+            for v in dict.fromkeys(
+                [local_var_table, prefetch_ret_entity_table, prefetch_ret_var_table]
+            ):
+                _logger.debug("remove temp store view %s.", v)
+                session.store.remove_view(v)
+    else:
+        _logger.debug(
+            'prefetch return None, just rename native GET pattern matching results into "%s".',
+            return_var_table,
+        )
+        session.store.rename_view(local_var_table, return_var_table)
+
+
 def _filter_prefetched_process(
     return_var_name, session, local_var, prefetched_entity_table, return_type
 ):
 
-    _logger.debug(f"filter prefetched {return_type} for {prefetched_entity_table}.")
+    _logger.debug("filter prefetched %s for %s.", return_type, prefetched_entity_table)
 
     prefetch_filtered_var_name = return_var_name + "_prefetch_filtered"
     entity_ids = fine_grained_relational_process_filtering(
@@ -609,7 +589,7 @@ def _filter_prefetched_process(
     id_pattern = build_pattern_from_ids(return_type, entity_ids)
     if id_pattern:
         session.store.extract(prefetch_filtered_var_name, return_type, None, id_pattern)
-        _logger.debug(f"filter successful.")
+        _logger.debug("filter successful.")
         return prefetch_filtered_var_name
     else:
         _logger.info("no prefetched process found after filtering.")
@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
 from pandas import DataFrame
 from io import StringIO
+import functools
 import json
 
 from kestrel.exceptions import KestrelInternalError
 
+# compact JSON for the messages sent to front ends
+_dump_json = functools.partial(json.dumps, separators=(",", ":"))
+
 
 class AbstractDisplay(ABC):
     @abstractmethod
@@ -44,7 +48,7 @@ class DisplayDataframe(AbstractDisplay):
     def to_json(self):
         body = self.dataframe.to_json(orient="records")
         msg = {"display": "dataframe", "data": "<<<BODY>>>"}
-        return json.dumps(msg).replace('"<<<BODY>>>"', body)
+        return _dump_json(msg).replace('"<<<BODY>>>"', body)
 
     def to_dict(self):
         body = self.dataframe.fillna(0).to_dict(orient="records")
@@ -87,7 +91,7 @@ class DisplayBlockSummary(DisplayDataframe):
                 "footnotes": self.footnotes,
             },
         }
-        return json.dumps(msg).replace('"<<<DATA>>>"', data)
+        return _dump_json(msg).replace('"<<<DATA>>>"', data)
 
     def to_dict(self):
         data = self.dataframe.fillna(0).to_dict(orient="records")
@@ -127,7 +131,7 @@ class DisplayDict(AbstractDisplay):
 
     def to_json(self):
         msg = {"display": "dict", "data": self.dict}
-        return json.dumps(msg)
+        return _dump_json(msg)
 
     def to_dict(self):
         msg = {"display": "dict", "data": self.dict}
@@ -1,18 +1,22 @@
 import ast
-from lark import Lark, Transformer, Tree
+from lark import Lark, Tree
+from lark.exceptions import VisitError
+from lark.visitors import Transformer_InPlace
 from pkgutil import get_data
 
+from kestrel.config import CONFIG_DIR_DEFAULT
+
 
 def parse(stmts, default_variable="_", default_sort_order="desc"):
     # the public parsing interface for Kestrel
     # return abstract syntax tree
     # check kestrel.lark for details
-    grammar = get_data(__name__, "kestrel.lark").decode("utf-8")
-    return Lark(
-        grammar,
-        parser="lalr",
-        transformer=_PostParsing(default_variable, default_sort_order),
-    ).parse(stmts)
+    tree = _PARSER.parse(stmts)
+    try:
+        return _PostParsing(default_variable, default_sort_order).transform(tree)
+    except VisitError as e:
+        # raise errors from the transformer as-is (not wrapped by Lark)
+        raise e.orig_exc
 
 
 def get_all_input_var_names(stmt):
@@ -26,7 +30,33 @@ def get_all_input_var_names(stmt):
 ################################################################
 
 
-class _PostParsing(Transformer):
+_CACHE_PATH = CONFIG_DIR_DEFAULT / "kestrel.lark.cache"
+
+
+def _build_parser():
+    grammar = get_data(__name__, "kestrel.lark").decode("utf-8")
+    options = {
+        "parser": "lalr",
+        "lexer": "contextual",
+        "propagate_positions": False,
+        "maybe_placeholders": False,
+    }
+    try:
+        # Lark pickles the LALR tables into the per-user config directory
+        # never cache in a shared location: the cache file is unpickled on load
+        _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        return Lark(grammar, cache=str(_CACHE_PATH), **options)
+    except OSError:
+        # config directory not writable: build without the on-disk cache
+        return Lark(grammar, **options)
+
+
+# build the parser once per process
+# the transformer is applied per call since it carries per-session defaults
+_PARSER = _build_parser()
+
+
+class _PostParsing(Transformer_InPlace):
     def __init__(self, default_variable, default_sort_order):
         self.default_variable = default_variable
         self.default_sort_order = default_sort_order
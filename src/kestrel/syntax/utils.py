@@ -1,5 +1,3 @@
-from lark import Lark
-from pkgutil import get_data
 from itertools import chain
 
 from kestrel.codegen.relations import (
@@ -7,6 +5,7 @@ from kestrel.codegen.relations import (
     stix_2_0_ref_mapping,
     stix_2_0_identical_mapping,
 )
+from kestrel.syntax.parser import _PARSER
 
 
 LITERALS = {"CNAME", "LETTER", "DIGIT", "WS", "INT", "WORD", "ESCAPED_STRING", "NUMBER"}
@@ -14,9 +13,8 @@ AGG_FUNCS = {"MIN", "MAX", "AVG", "SUM", "COUNT", "NUNIQUE"}
 
 
 def get_keywords():
-    grammar = get_data(__name__, "kestrel.lark").decode("utf-8")
-    parser = Lark(grammar, parser="lalr")
-    alphabet_patterns = filter(lambda x: x.pattern.value.isalnum(), parser.terminals)
+    # reuse the parser built by kestrel.syntax.parser: same grammar
+    alphabet_patterns = filter(lambda x: x.pattern.value.isalnum(), _PARSER.terminals)
     keywords = [x.pattern.value for x in alphabet_patterns] + all_relations
     keywords_lower = map(lambda x: x.lower(), keywords)
     keywords_upper = map(lambda x: x.upper(), keywords)
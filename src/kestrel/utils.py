@@ -13,28 +13,24 @@ def update_nested_dict(dict_old, dict_new):
     return dict_old
 
 
-def remove_empty_dicts(ds):
-    # remove dict with all values as None in list({string:string})
-    # this is the results from SQL query
-    return [d for d in ds if set(d.values()) != {None}]
-
-
 def dedup_dicts(ds):
     # deduplicate list({string:string})
     # this is the results from SQL query
     return [dict(s) for s in set(frozenset(d.items()) for d in ds)]
 
 
-def dedup_ordered_dicts(ds):
-    # deduplicate list({string:string})
+def dedup_ordered_nonempty_dicts(ds):
+    # deduplicate list({string:string}) and remove dict with all values as None
     # maintain the order if seen
+    # this is the results from SQL query
     res = []
     seen = set()
     for d in ds:
-        s = str(d)
-        if s not in seen:
-            res.append(d)
-        seen.add(s)
+        if set(d.values()) != {None}:
+            s = str(d)
+            if s not in seen:
+                res.append(d)
+                seen.add(s)
     return res
 
 
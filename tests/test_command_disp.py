@@ -51,3 +51,29 @@ newvar = NEW [ {"type": "network-traffic", "src_ref.value": "1.2.3.4", "dst_ref.
         out = s.execute("DISP grpvar")
         data = out[0].to_dict()['data']
         assert len(data) == 2
+
+
+def test_disp_drops_empty_and_duplicate_rows():
+    with Session() as s:
+        stmt = """
+newvar = NEW [ {"type": "process", "name": "cmd.exe", "pid": "123"}
+             , {"type": "process", "pid": "7"}
+             , {"type": "process", "name": "explorer.exe", "pid": "99"}
+             , {"type": "process", "name": "cmd.exe", "pid": "456"}
+             ]
+"""
+        s.execute(stmt)
+        s.execute("asc = SORT newvar BY name ASC")
+        s.execute("desc = SORT newvar BY name DESC")
+        # the row without name is all None and is dropped
+        # duplicates are removed while keeping the order of first occurrence
+        out = s.execute("DISP asc ATTR name")
+        assert out[0].to_dict()["data"] == [
+            {"name": "cmd.exe"},
+            {"name": "explorer.exe"},
+        ]
+        out = s.execute("DISP desc ATTR name")
+        assert out[0].to_dict()["data"] == [
+            {"name": "explorer.exe"},
+            {"name": "cmd.exe"},
+        ]
@@ -0,0 +1,34 @@
+import pytest
+
+from kestrel.session import Session
+
+
+def test_info():
+    with Session() as s:
+        stmt = """
+newvar = NEW [ {"type": "process", "name": "cmd.exe", "pid": "123", "x_unique_id": "1"}
+             , {"type": "process", "name": "explorer.exe", "pid": "99", "x_unique_id": "2"}
+             ]
+"""
+        s.execute(stmt)
+        out = s.execute("INFO newvar")
+        data = out[0].to_dict()["data"]
+        assert data["Entity Type"] == "process"
+        assert data["Number of Entities"] == "2"
+        assert data["Birth Command"] == "new"
+        assert data["Customized Attributes"] == "x_unique_id"
+
+
+def test_info_indirect_attributes_grouped():
+    with Session() as s:
+        stmt = """
+conns = NEW [ {"type": "network-traffic", "src_ref.value": "1.2.3.4", "dst_ref.value": "4.3.2.1", "src_ref.resolves_to_str": "foo"}
+            ]
+"""
+        s.execute(stmt)
+        out = s.execute("INFO conns")
+        data = out[0].to_dict()["data"]
+        assert data["Indirect Attributes"] == [
+            "src_ref.value, src_ref.resolves_to_str",
+            "dst_ref.value",
+        ]
@@ -1,89 +1,120 @@
 import re
 
 from lark import UnexpectedToken
+import lark.lark
 import pytest
 
+import kestrel.syntax.parser
 from kestrel.syntax.parser import parse
 
+START_STOP_RE = re.compile(r" START .* STOP .*")
+
+
+def parse_one(stmt):
+    results = parse(stmt)
+    assert len(results) == 1
+    return results[0]
+
 
 def test_simple_get():
-    results = parse("y = get url from udi://all where [url:value LIKE '%']")
-    result = results[0]
-    assert result["command"] == "get"
-    assert result["type"] == "url"
-    assert result["datasource"] == "udi://all"
-    assert result["patternbody"] == "[url:value LIKE '%']"
+    result = parse_one("y = get url from udi://all where [url:value LIKE '%']")
+    assert result == {
+        "command": "get",
+        "output": "y",
+        "type": "url",
+        "datasource": "udi://all",
+        "patternbody": "[url:value LIKE '%']",
+        "timerange": None,
+    }
 
 
 def test_quoted_datasource():
-    results = parse("y = get url from \"udi://My QRadar\" where [url:value LIKE '%']")
-    result = results[0]
-    assert result["command"] == "get"
-    assert result["type"] == "url"
-    assert result["datasource"] == "udi://My QRadar"
-    assert result["patternbody"] == "[url:value LIKE '%']"
+    result = parse_one("y = get url from \"udi://My QRadar\" where [url:value LIKE '%']")
+    assert result == {
+        "command": "get",
+        "output": "y",
+        "type": "url",
+        "datasource": "udi://My QRadar",
+        "patternbody": "[url:value LIKE '%']",
+        "timerange": None,
+    }
 
 
 @pytest.mark.parametrize(
-    "outvar, sco_type, ds, pat",
+    "outvar, sco_type, ds, ds_expected, pat",
     [
-        ("_my_var", "ipv4-addr", "something", "[ipv4-addr:value = '192.168.121.121']"),
+        (
+            "_my_var",
+            "ipv4-addr",
+            "something",
+            "something",
+            "[ipv4-addr:value = '192.168.121.121']",
+        ),
         (
             "X1",
             "x-custom-object",
             "myscheme://foo.bar/whatever",
+            "myscheme://foo.bar/whatever",
             "[x-other-custom-thing:x_custom_prop IN ('a', 'b', 'c']",
         ),
         (
             "urls",
             "url",
             "file:///shared-vol/udsstx",
+            "file:///shared-vol/udsstx",
             "[url:value LIKE 'https://%'] START t'2021-03-29T19:25:12.345Z' STOP t'2021-03-29T19:30:12.345Z'",
         ),
         (
             "ext_dns_conns",
             "network-traffic",
             '"udi://10k Traffic"',
+            "udi://10k Traffic",  # the parser strips the double quotes
             "[network-traffic:dst_port = 53 AND network-traffic:dst_ref.value NOT ISSUBSET '192.168.1.0/24']",
         ),
     ],
+    ids=["simple", "custom-object", "timerange", "quoted-datasource"],
 )
-def test_parser_get(outvar, sco_type, ds, pat):
-    patbody = re.sub(r" START .* STOP .*", "", pat)
-    results = parse(f"{outvar} = GET {sco_type} FROM {ds} WHERE {pat}")
-    result = results[0]
+def test_parser_get(outvar, sco_type, ds, ds_expected, pat):
+    patbody = START_STOP_RE.sub("", pat)
+    result = parse_one(f"{outvar} = GET {sco_type} FROM {ds} WHERE {pat}")
     assert result["output"] == outvar
     assert result["command"] == "get"
     assert result["type"] == sco_type
-    assert result["datasource"] == ds.strip('"')  # We strip the double quotes
+    assert result["datasource"] == ds_expected
     assert result["patternbody"] == patbody
 
 
 def test_apply_params():
-    results = parse("apply xyz://my_analytic on foo with x=1, y=a,b,c")
-    result = results[0]
-    assert result["command"] == "apply"
-    assert result["workflow"] == "xyz://my_analytic"
-    assert result["inputs"] == ["foo"]
-    assert result["parameter"] == {"x": 1, "y": ["a", "b", "c"]}
+    result = parse_one("apply xyz://my_analytic on foo with x=1, y=a,b,c")
+    assert result == {
+        "command": "apply",
+        "output": "_",
+        "workflow": "xyz://my_analytic",
+        "inputs": ["foo"],
+        "parameter": {"x": 1, "y": ["a", "b", "c"]},
+    }
 
 
 def test_apply_params_with_dots():
-    results = parse("apply xyz://my_analytic on foo with x=0.1, y=a.value")
-    result = results[0]
-    assert result["command"] == "apply"
-    assert result["workflow"] == "xyz://my_analytic"
-    assert result["inputs"] == ["foo"]
-    assert result["parameter"] == {"x": 0.1, "y": "a.value"}
+    result = parse_one("apply xyz://my_analytic on foo with x=0.1, y=a.value")
+    assert result == {
+        "command": "apply",
+        "output": "_",
+        "workflow": "xyz://my_analytic",
+        "inputs": ["foo"],
+        "parameter": {"x": 0.1, "y": "a.value"},
+    }
 
 
 def test_apply_params_with_decimal_and_dots():
-    results = parse("apply xyz://my_analytic on foo with x=0.1, y=a.value,b,c")
-    result = results[0]
-    assert result["command"] == "apply"
-    assert result["workflow"] == "xyz://my_analytic"
-    assert result["inputs"] == ["foo"]
-    assert result["parameter"] == {"x": 0.1, "y": ["a.value", "b", "c"]}
+    result = parse_one("apply xyz://my_analytic on foo with x=0.1, y=a.value,b,c")
+    assert result == {
+        "command": "apply",
+        "output": "_",
+        "workflow": "xyz://my_analytic",
+        "inputs": ["foo"],
+        "parameter": {"x": 0.1, "y": ["a.value", "b", "c"]},
+    }
 
 
 def test_apply_params_no_equals():
@@ -91,74 +122,80 @@ def test_apply_params_no_equals():
         parse("apply xyz://my_analytic on foo with x=1, y")
 
 
-def test_grouping_0():
-    results = parse("y = group x by foo")
-    result = results[0]
-    print(result)
-    assert result["command"] == "group"
-    assert result["input"] == "x"
-    assert result["paths"] == ["foo"]
-    assert "aggregations" not in result
-
-
-def test_grouping_1():
-    results = parse("y = group x by foo with sum(baz)")
-    result = results[0]
-    print(result)
-    assert result["command"] == "group"
-    assert result["input"] == "x"
-    assert result["paths"] == ["foo"]
-    assert result["aggregations"] == [
-        {
-            'attr': 'baz',
-            'func': 'sum',
-            'alias': 'sum_baz'
-        },
-    ]
-
-
-def test_grouping_2():
-    results = parse("y = group x BY foo, bar WITH MAX(baz) AS biggest, MIN(blah)")
-    result = results[0]
-    print(result)
-    assert result["command"] == "group"
-    assert result["input"] == "x"
-    assert result["paths"] == ["foo", "bar"]
-    assert result["aggregations"] == [
-        {
-            'attr': 'baz',
-            'func': 'max',
-            'alias': 'biggest'
-        },
-        {
-            'attr': 'blah',
-            'func': 'min',
-            'alias': 'min_blah'
-        },
-    ]
-
-
-def test_grouping_3():
-    results = parse("y = group x by foo with avg(bar), count(baz), max(blah) as whatever")
-    result = results[0]
-    print(result)
-    assert result["command"] == "group"
-    assert result["input"] == "x"
-    assert result["paths"] == ["foo"]
-    assert result["aggregations"] == [
-        {
-            'attr': 'bar',
-            'func': 'avg',
-            'alias': 'avg_bar'
-        },
-        {
-            'attr': 'baz',
-            'func': 'count',
-            'alias': 'count_baz'
-        },
-        {
-            'attr': 'blah',
-            'func': 'max',
-            'alias': 'whatever'
-        },
-    ]
+def test_apply_params_invalid_number():
+    with pytest.raises(SyntaxError):
+        parse("apply xyz://my_analytic on foo with x=01")
+
+
+@pytest.mark.parametrize(
+    "stmt, expected",
+    [
+        (
+            "y = group x by foo",
+            {"command": "group", "input": "x", "output": "y", "paths": ["foo"]},
+        ),
+        (
+            "y = group x by foo with sum(baz)",
+            {
+                "command": "group",
+                "input": "x",
+                "output": "y",
+                "paths": ["foo"],
+                "aggregations": [{"attr": "baz", "func": "sum", "alias": "sum_baz"}],
+            },
+        ),
+        (
+            "y = group x BY foo, bar WITH MAX(baz) AS biggest, MIN(blah)",
+            {
+                "command": "group",
+                "input": "x",
+                "output": "y",
+                "paths": ["foo", "bar"],
+                "aggregations": [
+                    {"attr": "baz", "func": "max", "alias": "biggest"},
+                    {"attr": "blah", "func": "min", "alias": "min_blah"},
+                ],
+            },
+        ),
+        (
+            "y = group x by foo with avg(bar), count(baz), max(blah) as whatever",
+            {
+                "command": "group",
+                "input": "x",
+                "output": "y",
+                "paths": ["foo"],
+                "aggregations": [
+                    {"attr": "bar", "func": "avg", "alias": "avg_bar"},
+                    {"attr": "baz", "func": "count", "alias": "count_baz"},
+                    {"attr": "blah", "func": "max", "alias": "whatever"},
+                ],
+            },
+        ),
+    ],
+    ids=["no-aggregation", "one-aggregation", "alias-and-default", "three-aggregations"],
+)
+def test_grouping(stmt, expected):
+    assert parse_one(stmt) == expected
+
+
+def test_parser_cache_not_writable(tmp_path, monkeypatch):
+    lark_open = lark.lark.FS.open
+
+    def deny_write(name, mode="r", **kwargs):
+        if "w" in mode:
+            raise PermissionError(13, "Permission denied", name)
+        return lark_open(name, mode, **kwargs)
+
+    monkeypatch.setattr(lark.lark.FS, "open", deny_write)
+    monkeypatch.setattr(
+        kestrel.syntax.parser, "_CACHE_PATH", tmp_path / "kestrel.lark.cache"
+    )
+    monkeypatch.setattr(
+        kestrel.syntax.parser, "_PARSER", kestrel.syntax.parser._build_parser()
+    )
+    assert parse_one("y = group x by foo") == {
+        "command": "group",
+        "input": "x",
+        "output": "y",
+        "paths": ["foo"],
+    }